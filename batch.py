@@ -0,0 +1,148 @@
+'''Renders many figures of group orbits at once.
+
+The figures are described in a JSON spec file such as:
+
+        {"jobs": [
+            {"group": "modular", "depth": 12, "base": "stickman", "args": [0.3], "pgf": "modular12.pgf"},
+            {"group": "modular", "depth": 16, "base": "stickman", "args": [0.3], "colors": ["red","blue"], "svg": "modular16.svg"},
+            {"group": "triangle", "lmn": [8,8,4], "depth": 10, "base": "triangletile", "svg": "tiling.svg", "pgf": "tiling.pgf"}
+        ]}
+
+Each job draws its base figure moved by every element of the group whose word length is at most depth.
+The base is the name of a function in dibujos, triangletile (the triangle of the group), or 'module:function', called with args.
+If colors is given the levels of the orbit (word lengths) are drawn with these colors in turn.
+
+Each distinct group is computed once into a shared cache, deeper jobs extending the levels computed for shallower ones,
+and the figures are then rendered concurrently on a process pool.  Usage:
+
+        python batch.py spec.json [--workers N] [--report report.json]
+
+which prints the time taken by each job.
+'''
+
+import json
+import time
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+from dibujos import *
+from modulargroup import modulargrouplevels, diskmatrices
+from orbitstore import trianglelevels, triangletile, frames
+
+class Orbitcache(object):
+    '''The levels (word lengths) of the orbits of the groups computed so far, as pairs (matrices, orientations).
+
+    Asking for a deeper orbit of a group continues computing from the levels already there.'''
+    def __init__(self):
+        self.orbits = {}
+
+    def key(self,job):
+        if job['group'] == 'modular':
+            return ('modular',)
+        if job['group'] == 'triangle':
+            return ('triangle',)+tuple(job['lmn'])
+        raise ValueError('Unknown group '+repr(job['group']))
+
+    def generator(self,key):
+        if key[0] == 'modular':
+            for level in modulargrouplevels():
+                yield diskmatrices(level),np.ones(len(level),dtype=np.int8)
+        else:
+            yield from trianglelevels(*key[1:])
+
+    def levels(self,job):
+        '''The levels of the orbit of the group of job up to its depth.'''
+        key = self.key(job)
+        if key not in self.orbits:
+            self.orbits[key] = (self.generator(key),[])
+        generator,levels = self.orbits[key]
+        while len(levels) <= job['depth']:
+            levels.append(next(generator))
+        return levels[:job['depth']+1]
+
+def basefigure(job):
+    '''The figure moved by the group elements in job.'''
+    name = job.get('base','stickman')
+    args = job.get('args',[])
+    if name == 'triangletile':
+        return triangletile(*(args or job['lmn']))
+    if ':' in name:
+        module,function = name.split(':')
+        return getattr(importlib.import_module(module),function)(*args)
+    return globals()[name](*args)
+
+def render(job,base,levels):
+    '''Draws one job (in a worker process).  Returns the number of group elements and the time it took.'''
+    start = time.time()
+    colors = job.get('colors') or [None]
+    figures = []
+    for i,color in enumerate(colors):
+        selected = levels[i::len(colors)]
+        if len(selected) == 0:
+            continue
+        matrices = np.concatenate([m for m,o in selected])
+        orientations = np.concatenate([o for m,o in selected])
+        colored = base
+        if color is not None:
+            colored = Figure(Frame.origin()*x for x in base)
+            for x in colored:
+                x.color = color
+        figures.append(Instancedfigure(colored,frames(matrices,orientations)))
+    # The geometry is computed once by write and then written in each format.
+    Figure(figures).write(pgf=job.get('pgf'),svg=job.get('svg'),drawboundary=job.get('drawboundary',True))
+    return sum(len(o) for m,o in levels),time.time()-start
+
+def depth(job):
+    '''The depth of job for sorting, jobs without a valid depth go first (and fail).'''
+    return job.get('depth') if isinstance(job.get('depth'),int) else -1
+
+def run(jobs,workers=None):
+    '''Runs the jobs, returns a list with a report (a dictionary) for each one.
+
+    A job that fails, while computing its orbit or while rendering, has its error in the report and doesn't stop the others.
+    The reports are in the order of the jobs.'''
+    cache = Orbitcache()
+    reports = [{'outputs':[job[f] for f in ['pgf','svg'] if f in job],'group':[job.get('group')],'depth':job.get('depth')} for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        # Shallow jobs first, so deeper ones extend their orbits.
+        for job,report in sorted(zip(jobs,reports),key=lambda pair: depth(pair[0])):
+            try:
+                report['group'] = list(cache.key(job))
+                start = time.time()
+                levels = cache.levels(job)
+                report['orbit'] = time.time()-start
+                futures.append((report,executor.submit(render,job,basefigure(job),levels)))
+            except Exception as error:
+                report['error'] = repr(error)
+        for report,future in futures:
+            try:
+                report['elements'],report['render'] = future.result()
+            except Exception as error:
+                report['error'] = repr(error)
+    return reports
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Renders the figures described in a JSON spec file.')
+    parser.add_argument('spec')
+    parser.add_argument('--workers',type=int,default=None)
+    parser.add_argument('--report',default=None,help='also write the report to this JSON file')
+    options = parser.parse_args(argv)
+    with open(options.spec) as f:
+        jobs = json.load(f)['jobs']
+    start = time.time()
+    reports = run(jobs,options.workers)
+    print('{:40} {:>10} {:>6} {:>9} {:>9} {:>9}'.format('outputs','group','depth','elements','orbit(s)','render(s)'))
+    for r in reports:
+        columns = [','.join(r['outputs']),'-'.join(map(str,r['group'])),str(r['depth'])]
+        if 'error' in r:
+            print('{:40} {:>10} {:>6} failed: {}'.format(*columns,r['error']))
+        else:
+            print('{:40} {:>10} {:>6} {:>9} {:>9.3f} {:>9.3f}'.format(*columns,r['elements'],r['orbit'],r['render']))
+    print('total {:.3f}s'.format(time.time()-start))
+    if options.report is not None:
+        with open(options.report,'w') as f:
+            json.dump(reports,f,indent=1)
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,8 @@
 '''Dibujos Hiperbolicos: a tool for generating figures of the Poincaré disk model of the hyperbolic plane.'''
 
 from math import *
+import sys
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 # To begin we define the radii of the boundary circle for pgf and svg output figures.
@@ -75,75 +77,317 @@ def Background(drawable):
     drawable.layer = 'background'
     return drawable
 
+# Colors and layers are not stored as strings in each drawable.  Instead every drawable has a .style attribute which is an index into
+# the following table of (color, layer) pairs, and the .color and .layer attributes are properties reading and writing this table.
+# Together with __slots__ this keeps drawables small when figures have millions of them.
+
+styles = []
+styleids = {}
+
+def styleid(color,layer):
+    '''Returns the index of (color,layer) in the style table, adding the pair if it's new.'''
+    key = (color,layer)
+    if key not in styleids:
+        styleids[key] = len(styles)
+        styles.append((sys.intern(color),sys.intern(layer)))
+    return styleids[key]
+
+class Styled(object):
+    '''Base class for drawables providing the .color and .layer properties from the .style id,
+    and the .tikzline and .svgline properties from the .primitives of the drawable.'''
+    __slots__ = ()
+
+    @property
+    def color(self):
+        return styles[self.style][0]
+
+    @color.setter
+    def color(self,color):
+        self.style = styleid(color,self.layer)
+
+    @property
+    def layer(self):
+        return styles[self.style][1]
+
+    @layer.setter
+    def layer(self,layer):
+        self.style = styleid(self.color,layer)
+
+    def __getstate__(self):
+        # Style ids only make sense inside one process, so pickles store the color and layer themselves.
+        state = dict((name,getattr(self,name)) for cls in type(self).__mro__ for name in getattr(cls,'__slots__',()) if name != 'style')
+        state['style'] = (self.color,self.layer)
+        return state
+
+    def __setstate__(self,state):
+        for name,value in state.items():
+            if name == 'style':
+                value = styleid(*value)
+            setattr(self,name,value)
+
+    @property
+    def tikzline(self):
+        return ''.join(tikzprimitive(p) for p in self.primitives)
+
+    @property
+    def svgline(self):
+        return ''.join(svgprimitive(p) for p in self.primitives)
+
+# The geometry of each drawable is computed once, in the coordinates of the unit disk, as a list of primitives given by its .primitives attribute.
+# Primitives are tuples whose first entry is their kind:
+#   ('dot',center,radius,color)             a filled circle (used for points)
+#   ('circle',center,radius,color)          a circle
+#   ('disk',center,radius,color)            a filled circle with a border
+#   ('polyline',points,color)               Euclidean segments joining the points
+#   ('arc',start,end,center,color)          the arc of the circle with the given center going from start to end (less than half the circle)
+#   ('polygon',points,centers,fill,color)   a closed path through the points, the side from points[i] to points[i+1] is an arc
+#                                           of the circle with center centers[i] or a straight segment if it's None (fill can be None)
+# All points are complex numbers.  The functions below turn a primitive into a line of a pgf or svg file (scaling by pgfdiskradius or svgdiskradius),
+# so writing one figure in both formats computes its geometry only once.
+
+def tikzprimitive(primitive):
+    '''The pgf code drawing a primitive (an empty string if it's too small to be drawn).'''
+    kind,color = primitive[0],primitive[-1]
+    if kind in ['dot','circle','disk']:
+        center,radius = pgfdiskradius*primitive[1],pgfdiskradius*primitive[2]
+        if '{:.3f}'.format(radius) == '0.000':
+            return ''               # Avoid outputting circles of radius 0 to the file.
+        options = {'dot':'fill='+color+','+color,'circle':color,'disk':color+', fill='+color}[kind]
+        return '\\draw['+options+'] '+'({:.3f},{:.3f})'.format(center.real,center.imag)+' circle '+'({:.3f})'.format(radius)+';'
+    if kind == 'polyline':
+        return '\\draw['+color+'] '+' -- '.join('({:.3f},{:.3f})'.format(pgfdiskradius*p.real,pgfdiskradius*p.imag) for p in primitive[1])+';'
+    if kind == 'arc':
+        start,end,center = primitive[1:4]
+        radius = pgfdiskradius*abs(start-center)
+        startangle = 360*np.angle(start-center)/(2*pi)
+        # make sure the difference between startangle and endangle is less than 180
+        endangle = startangle + 360*np.angle((end-center)/(start-center))/(2*pi)
+        return '\\draw['+color+'] '+'({:.3f},{:.3f})'.format(pgfdiskradius*start.real,pgfdiskradius*start.imag)+' arc ' + '({:.3f}:{:.3f}:{:.3f});'.format(startangle,endangle,radius)
+    if kind == 'polygon':
+        points,centers,fill = primitive[1:4]
+        path = '({:.3f},{:.3f})'.format(pgfdiskradius*points[0].real,pgfdiskradius*points[0].imag)
+        for start,end,center in zip(points,points[1:]+points[:1],centers):
+            if center is None:
+                path += ' -- ({:.3f},{:.3f})'.format(pgfdiskradius*end.real,pgfdiskradius*end.imag)
+            else:
+                startangle = 360*np.angle(start-center)/(2*pi)
+                endangle = startangle + 360*np.angle((end-center)/(start-center))/(2*pi)
+                path += ' arc ({:.3f}:{:.3f}:{:.3f})'.format(startangle,endangle,pgfdiskradius*abs(start-center))
+        options = color if fill is None else color+', fill='+fill
+        return '\\draw['+options+'] '+path+' -- cycle;'
+    raise ValueError('Unknown primitive '+repr(kind))
+
+def svgprimitive(primitive):
+    '''The svg element drawing a primitive (an empty string if it's too small to be drawn).'''
+    kind,color = primitive[0],primitive[-1]
+    if kind in ['dot','circle','disk']:
+        center,radius = svgdiskradius*primitive[1],svgdiskradius*primitive[2]
+        if '{:.3f}'.format(radius) == '0.000':
+            return ''               # Avoid outputting circles of radius 0 to the file.
+        fill = 'none' if kind == 'circle' else color
+        return '<circle cx="{:.3f}" cy="{:.3f}" r="{:.3f}" fill="{}" stroke="{}"/>'.format(center.real,center.imag,radius,fill,color)
+    if kind == 'polyline':
+        d = ' L'.join('{:.3f},{:.3f}'.format(svgdiskradius*p.real,svgdiskradius*p.imag) for p in primitive[1])
+        return '<path d="M{}" fill="none" stroke="{}"/>'.format(d,color)
+    if kind == 'arc':
+        start,end,center = primitive[1:4]
+        radius = svgdiskradius*abs(start-center)
+        angle = np.angle((end-center)/(start-center))
+        # Svg needs the start point, endpoint radius (actually x and y radius both equal in our case),
+        # rotation of x axis (0 in our case),
+        # a flag noting if the long arc is drawn or the short one (0 for short arc is always our case),
+        # and one flat determines which side the center is on (the one we will set now)
+        # If you do this wrong either Segment(p,q) or Segment(q,p) will bend in the wrong direction.
+        if angle <= 0:
+            sweepflag = '0'
+        else:
+            sweepflag = '1'
+        d = 'M{:.3f},{:.3f}'.format(svgdiskradius*start.real,svgdiskradius*start.imag)+' A{:3f},{:3f} 0 0 {} '.format(radius,radius,sweepflag)+'{:.3f},{:.3f}'.format(svgdiskradius*end.real,svgdiskradius*end.imag)
+        return '<path d="{}" fill="none" stroke="{}"/>'.format(d,color)
+    if kind == 'polygon':
+        points,centers,fill = primitive[1:4]
+        d = 'M{:.3f},{:.3f}'.format(svgdiskradius*points[0].real,svgdiskradius*points[0].imag)
+        for start,end,center in zip(points,points[1:]+points[:1],centers):
+            endstring = '{:.3f},{:.3f}'.format(svgdiskradius*end.real,svgdiskradius*end.imag)
+            if center is None:
+                d += ' L'+endstring
+            else:
+                radius = svgdiskradius*abs(start-center)
+                sweepflag = '0' if np.angle((end-center)/(start-center)) <= 0 else '1'
+                d += ' A{:3f},{:3f} 0 0 {} '.format(radius,radius,sweepflag)+endstring
+        return '<path d="{} Z" fill="{}" stroke="{}"/>'.format(d,'none' if fill is None else fill,color)
+    raise ValueError('Unknown primitive '+repr(kind))
+
+# The beginning and end of pgf and svg files, and of each layer in a pgf file.
+
+def pgfheader(drawboundary=True):
+    header = '\\pgfdeclarelayer{background}\n\\pgfdeclarelayer{foreground}\n\\pgfsetlayers{background,main,foreground}\n\\begin{tikzpicture}\n'
+    if drawboundary:
+        header += '\\begin{pgfonlayer}{foreground}\\draw (0,0) circle ('+str(pgfdiskradius)+');\\end{pgfonlayer}\n'
+    return header
+
+def pgffooter():
+    return '\\end{tikzpicture}\n'
+
+pgflayerstart = {'background':'\n\\begin{pgfonlayer}{background}\n','main':'\n','foreground':'\n\\begin{pgfonlayer}{foreground}\n'}
+pgflayerend = {'background':'\\end{pgfonlayer}\n','main':'','foreground':'\\end{pgfonlayer}\n'}
+
+def svgheader(drawboundary=True):
+    size = int(3*svgdiskradius)
+    header = '<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" version="1.1">\n'.format(str(size),str(size))
+    # the y-coordinate needs to be flipped because in svg it grows downwards this is done with scale(1,-1)
+    header += '<g transform="translate({} {}) scale(1,-1)">'.format(str(size//2),str(size//2))
+    if drawboundary:
+        header += '<circle cx="0" cy="0" r="{}" fill="none" stroke="black"/>'.format(str(int(svgdiskradius)))
+    return header
+
+def svgfooter():
+    return '</g></svg>'
+
 # Finally, we start with the actual classes.  The drawables are Frames, Point, Boundarypoint, Circle, Disk, Segment, Halfline, Line.
 # The Figure class is a subclass of set and instances are supposed to hold drawables.
 # In particular if f is a figure you use f.add(drawable) to add a drawable to it but f.update(g) to add all drawables in some other figure g.
-# Each drawable has a .tikzline and a .svgline attribute which are used by the Figure writepgf and writesvg methods respectively.
+# Each drawable has a .primitives attribute which is used by the Figure writepgf and writesvg methods (and .tikzline and .svgline attributes with its pgf and svg code).
 
 class Figure(set):
     '''A figure is a set of Points, Frames, etc, with a writepgf method to output a pgf file.
     
     It can also be acted on by Frames (as isometries).'''
-    def writepgf(self,filename,drawboundary=True):
+    def writepgf(self,filename,drawboundary=True,lowered=None):
+        '''Writes the figure to a pgf file.  lowered can be the result of self.lower() if it was already computed.'''
         f = open(filename,'w')
-        f.write('\\pgfdeclarelayer{background}\n')
-        f.write('\\pgfdeclarelayer{foreground}\n')
-        f.write('\\pgfsetlayers{background,main,foreground}\n')
-        f.write('\\begin{tikzpicture}\n')
-
-        if drawboundary:
-            f.write('\\begin{pgfonlayer}{foreground}\\draw (0,0) circle ('+str(pgfdiskradius)+');\\end{pgfonlayer}\n')
-        
-        layerstartstr = {'background':'\n\\begin{pgfonlayer}{background}\n','main':'\n','foreground':'\n\\begin{pgfonlayer}{foreground}\n'}
-        layerendstr = {'background':'\\end{pgfonlayer}\n','main':'','foreground':'\\end{pgfonlayer}\n'}
-
+        f.write(pgfheader(drawboundary))
         for layer in ['background','main','foreground']:
-            f.write(layerstartstr[layer])
-            for x in self:
-                if x.layer == layer:
-                    line = x.tikzline
-                    if line != '':      # Avoid writting empty lines
-                        f.write(x.tikzline+'\n')
-            f.write(layerendstr[layer])
-
-        f.write('\\end{tikzpicture}\n')
+            f.write(pgflayerstart[layer])
+            for primitive in (lowered[layer] if lowered else self.lowered(layer)):
+                line = tikzprimitive(primitive)
+                if line != '':      # Avoid writting empty lines
+                    f.write(line+'\n')
+            f.write(pgflayerend[layer])
+        f.write(pgffooter())
         f.close()
 
-    def writesvg(self,filename,drawboundary=True):
+    def writesvg(self,filename,drawboundary=True,lowered=None):
+        '''Writes the figure to an svg file.  lowered can be the result of self.lower() if it was already computed.'''
         f = open(filename,'w')
-        size = int(3*svgdiskradius)
-        f.write('<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" version="1.1">\n'.format(str(size),str(size)))
-        # the y-coordinate needs to be flipped because in svg it grows downwards this is done with scale(1,-1)
-        f.write('<g transform="translate({} {}) scale(1,-1)">'.format(str(size//2),str(size//2)))
-
-        if drawboundary:
-            f.write('<circle cx="0" cy="0" r="{}" fill="none" stroke="black"/>'.format(str(int(svgdiskradius))))
-        
+        f.write(svgheader(drawboundary))
         for layer in ['background','main','foreground']:
-            for x in self:
-                if x.layer == layer:
-                    line = x.svgline
-                    if line != '':      # Avoid writting empty lines
-                        f.write(x.svgline+'\n')
-
-        f.write('</g>')
-        f.write('</svg>')
+            for primitive in (lowered[layer] if lowered else self.lowered(layer)):
+                line = svgprimitive(primitive)
+                if line != '':      # Avoid writting empty lines
+                    f.write(line+'\n')
+        f.write(svgfooter())
         f.close()
 
+    def write(self,pgf=None,svg=None,drawboundary=True,lowered=None):
+        '''Writes the figure to a pgf file, an svg file, or both.
+
+        The geometry is computed once (see lower, or pass its result as lowered) and the files are then written concurrently.'''
+        lowered = lowered or self.lower()
+        with ThreadPoolExecutor() as executor:
+            jobs = []
+            if pgf is not None:
+                jobs.append(executor.submit(self.writepgf,pgf,drawboundary,lowered))
+            if svg is not None:
+                jobs.append(executor.submit(self.writesvg,svg,drawboundary,lowered))
+            for job in jobs:
+                job.result()
+
+    def lowered(self,layer):
+        '''Iterates over the primitives of the drawables in the given layer.'''
+        for x in self.drawables(layer):
+            yield from x.primitives
+
+    def lower(self):
+        '''Computes the primitives of all drawables, returns a dictionary from layers to lists of primitives.'''
+        return dict((layer,list(self.lowered(layer))) for layer in ['background','main','foreground'])
+
+
+    def drawables(self,layer):
+        '''Iterates over the drawables in the given layer (a figure can also hold Instancedfigures, which are expanded).'''
+        for x in self:
+            if isinstance(x,Instancedfigure):
+                yield from x.drawables(layer)
+            elif x.layer == layer:
+                yield x
+
     def __rmul__(self,tangent):
         return Figure([tangent*x for x in self])
 
-class Frame(np.matrix):
+class Instancedfigure(object):
+    '''A figure made of copies of a base figure moved by a list of isometries (Frames).
+
+    Only the base figure and the isometries are stored, so f = Instancedfigure(stickman(),frames) costs one matrix per frame
+    instead of a copy of every drawable.  The base can itself be an Instancedfigure (instances of instances).
+    The moved drawables are only computed while writing, chunksize at a time.'''
+    chunksize = 4096
+
+    def __init__(self,base,isometries=()):
+        self.base = base
+        self.isometries = list(isometries)
+
+    def add(self,isometry):
+        self.isometries.append(isometry)
+
+    def update(self,isometries):
+        self.isometries.extend(isometries)
+
+    def __len__(self):
+        return len(self.isometries)*len(self.base)
+
+    def __iter__(self):
+        for layer in ['background','main','foreground']:
+            yield from self.drawables(layer)
+
+    def instances(self):
+        '''Yields pairs (isometry, figure) where figure is a Figure, composing the isometries of nested Instancedfigures.'''
+        for g in self.isometries:
+            if isinstance(self.base,Instancedfigure):
+                for h,figure in self.base.instances():
+                    yield g*h,figure
+            else:
+                yield g,self.base
+
+    def drawables(self,layer):
+        '''Iterates over the moved drawables in the given layer, computing them in chunks.'''
+        chunk = []
+        for g,figure in self.instances():
+            chunk.extend(g*x for x in figure.drawables(layer))
+            if len(chunk) >= self.chunksize:
+                yield from chunk
+                chunk = []
+        yield from chunk
+
+    def __rmul__(self,tangent):
+        return Instancedfigure(self.base,[tangent*g for g in self.isometries])
+
+    writepgf = Figure.writepgf
+    writesvg = Figure.writesvg
+    write = Figure.write
+    lower = Figure.lower
+    lowered = Figure.lowered
+
+class Frame(np.matrix,Styled):
     '''Frames represent both orthonormal tangent frames in the disk and hyperbolic isometries.
     
     Hence they can be drawn but also can act by multiplication on other drawables (including other frames)
     Several constructors are provided.  Frame.origin(), Frame.forward(d), Frame.rotate(a), Frame.sideways(d).
     A useful pattern is to create a tangent out of "instructions" e.g. t = Frame.forward(1)*Frame.rotate(pi/2)*Frame.forward(2)*Frame.rotate(pi/3).'''
     def __array_finalize__(self,*args,**kwargs):
-        self.color = 'black'
-        self.layer = 'foreground'
+        self.style = styleid('black','foreground')
         self.orientation = 1
 
+    def __reduce__(self):
+        # Pickles go through numpy, which keeps only the matrix, so the orientation, color and layer are added to its state.
+        function,args,state = np.matrix.__reduce__(self)
+        return function,args,(state,self.orientation,self.color,self.layer)
+
+    def __setstate__(self,state):
+        state,orientation,color,layer = state
+        np.matrix.__setstate__(self,state)
+        self.orientation = orientation
+        self.style = styleid(color,layer)
+
     def __mul__(self,other):
         if not isinstance(other,type(self)):
             return NotImplemented
@@ -153,15 +397,14 @@ class Frame(np.matrix):
             else:
                 result = super().__mul__(other)
             result.orientation = self.orientation*other.orientation
-            result.color = other.color
-            result.layer = other.layer
+            result.style = other.style
             return result
  
     def __hash__(self):
         return hash(str(self))
 
     def __eq__(self,other):
-        return self[0,0] == other[0,0] and self[0,1] == other[0,1] and self[1,0] == other[1,0] and self[1,1] == other[1,1] and self.orientation == other.orientation and self.color == other.color and self.layer == other.layer and self.orientation == other.orientation
+        return self[0,0] == other[0,0] and self[0,1] == other[0,1] and self[1,0] == other[1,0] and self[1,1] == other[1,1] and self.orientation == other.orientation and self.style == other.style
 
     @classmethod
     def fromrealmatrix(cls,matrix):
@@ -216,86 +459,57 @@ class Frame(np.matrix):
         a,b,c,d = self[0,0],self[0,1],self[1,0],self[1,1]
         return Point(b/d)
 
-    @property
-    def tikzline(self):
-        # first we generate a picture of the first vector in the frame
-        x = pgfdiskradius*complex(self.basepoint)
-        y = pgfdiskradius* complex((self*Frame.forward(tangentsize)).basepoint)
-        if (abs(x-y) < smallestsize*pgfdiskradius):
-            return ''
-        left = pgfdiskradius * complex((self*Frame.forward(tangentsize)*Frame.rotate(2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
-        right = pgfdiskradius * complex((self*Frame.forward(tangentsize)*Frame.rotate(-2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
-        line = '\\draw['+self.color+'] '+'({:.3f},{:.3f})'.format(x.real,x.imag) +' -- '+'({:.3f},{:.3f})'.format(y.real,y.imag)+' -- '+'({:.3f},{:.3f})'.format(left.real,left.imag)+' -- '+'({:.3f},{:.3f})'.format(y.real,y.imag)+' -- '+'({:.3f},{:.3f})'.format(right.real,right.imag)+';'
-        # now we repeat rotated a right angle for the second vector
-        x = pgfdiskradius*complex(self.basepoint)
-        y = pgfdiskradius* complex((self*Frame.rotate(pi/2)*Frame.forward(tangentsize)).basepoint)
-        if (abs(x-y) < smallestsize*pgfdiskradius):
-            return ''
-        left = pgfdiskradius * complex((self*Frame.rotate(pi/2)*Frame.forward(tangentsize)*Frame.rotate(2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
-        right = pgfdiskradius * complex((self*Frame.rotate(pi/2)*Frame.forward(tangentsize)*Frame.rotate(-2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
-        return line + '\\draw['+self.color+'] '+'({:.3f},{:.3f})'.format(x.real,x.imag) +' -- '+'({:.3f},{:.3f})'.format(y.real,y.imag)+' -- '+'({:.3f},{:.3f})'.format(left.real,left.imag)+' -- '+'({:.3f},{:.3f})'.format(y.real,y.imag)+' -- '+'({:.3f},{:.3f})'.format(right.real,right.imag)+';'
+    def arrow(self):
+        '''The points of a polyline drawing the first vector of the frame as an arrow (None if it's too small to draw).'''
+        x = complex(self.basepoint)
+        tip = self*Frame.forward(tangentsize)
+        y = complex(tip.basepoint)
+        if abs(x-y) < smallestsize:
+            return None
+        left = complex((tip*Frame.rotate(2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
+        right = complex((tip*Frame.rotate(-2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
+        return (x,y,left,y,right)
 
     @property
-    def svgline(self):
-        # first we generate a picture of the first vector in the frame
-        x = svgdiskradius*complex(self.basepoint)
-        y = svgdiskradius* complex((self*Frame.forward(tangentsize)).basepoint)
-        if (abs(x-y) < smallestsize*svgdiskradius):
-            return ''
-        left = svgdiskradius * complex((self*Frame.forward(tangentsize)*Frame.rotate(2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
-        right = svgdiskradius * complex((self*Frame.forward(tangentsize)*Frame.rotate(-2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
-        line = '<path d="{}" fill="none" stroke="{}"/>'.format(' L'.join(['M{:.3f},{:.3f}'.format(x.real,x.imag),'{:.3f},{:.3f}'.format(y.real,y.imag), '{:.3f},{:.3f}'.format(left.real,left.imag),'{:.3f},{:.3f}'.format(y.real,y.imag),'{:.3f},{:.3f}'.format(right.real,right.imag) ]), self.color)
-        # now we repeat rotated a right angle for the second vector
-        x = svgdiskradius*complex(self.basepoint)
-        y = svgdiskradius* complex((self*Frame.rotate(pi/2)*Frame.forward(tangentsize)).basepoint)
-        if (abs(x-y) < smallestsize*svgdiskradius):
-            return ''
-        left = svgdiskradius * complex((self*Frame.rotate(pi/2)*Frame.forward(tangentsize)*Frame.rotate(2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
-        right = svgdiskradius * complex((self*Frame.rotate(pi/2)*Frame.forward(tangentsize)*Frame.rotate(-2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
-        return line + '<path d="{}" fill="none" stroke="{}"/>'.format(' L'.join(['M{:.3f},{:.3f}'.format(x.real,x.imag),'{:.3f},{:.3f}'.format(y.real,y.imag), '{:.3f},{:.3f}'.format(left.real,left.imag),'{:.3f},{:.3f}'.format(y.real,y.imag),'{:.3f},{:.3f}'.format(right.real,right.imag) ]), self.color)
+    def primitives(self):
+        # the first vector in the frame and the second one (obtained by rotating a right angle)
+        arrows = [self.arrow(),(self*Frame.rotate(pi/2)).arrow()]
+        if None in arrows:
+            return []
+        return [('polyline',arrow,self.color) for arrow in arrows]
+
 
 class Tangent(Frame):
     '''Unit tangent vector.  Implemented as a frame that doesn't draw its second vector'''
+    __slots__ = ()
+
     def __rmul__(self,frame):
         '''I have absolutely no idea what I'm doing.'''
         partial = frame.__mul__(self)
         a,b,c,d = partial[0,0],partial[0,1],partial[1,0],partial[1,1]
         result = Tangent([[a,b],[c,d]])
         result.orientation = partial.orientation
-        result.color = partial.color
-        result.layer = partial.layer
+        result.style = partial.style
         return result
     
     @property
-    def tikzline(self):
-        x = pgfdiskradius*complex(self.basepoint)
-        y = pgfdiskradius* complex((self*Frame.forward(tangentsize)).basepoint)
-        if abs(x-y) < smallestsize*pgfdiskradius:
-            return ''
-        left = pgfdiskradius * complex((self*Frame.forward(tangentsize)*Frame.rotate(2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
-        right = pgfdiskradius * complex((self*Frame.forward(tangentsize)*Frame.rotate(-2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
-        return '\\draw['+self.color+'] '+'({:.3f},{:.3f})'.format(x.real,x.imag) +' -- '+'({:.3f},{:.3f})'.format(y.real,y.imag)+' -- '+'({:.3f},{:.3f})'.format(left.real,left.imag)+' -- '+'({:.3f},{:.3f})'.format(y.real,y.imag)+' -- '+'({:.3f},{:.3f})'.format(right.real,right.imag)+';'
+    def primitives(self):
+        arrow = self.arrow()
+        if arrow is None:
+            return []
+        return [('polyline',arrow,self.color)]
 
-    @property
-    def svgline(self):
-        x = svgdiskradius*complex(self.basepoint)
-        y = svgdiskradius* complex((self*Frame.forward(tangentsize)).basepoint)
-        if abs(x-y) < smallestsize*svgdiskradius:
-            return ''
-        left = svgdiskradius * complex((self*Frame.forward(tangentsize)*Frame.rotate(2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
-        right = svgdiskradius * complex((self*Frame.forward(tangentsize)*Frame.rotate(-2*pi/3)*Frame.forward(tangentsize/3)).basepoint)
-        return '<path d="{}" fill="none" stroke="{}"/>'.format(' L'.join(['M{:.3f},{:.3f}'.format(x.real,x.imag),'{:.3f},{:.3f}'.format(y.real,y.imag), '{:.3f},{:.3f}'.format(left.real,left.imag),'{:.3f},{:.3f}'.format(y.real,y.imag),'{:.3f},{:.3f}'.format(right.real,right.imag) ]), self.color)
-
-class Point(complex):
+
+class Point(Styled,complex):
     '''A point in the Poincaré disk model of the hyperbolic plane.
     
     Basically a complex number of modulus less than 1.
     You can construct them with modulus 1 (points at infinity or boundary points),
     But some methods (such as p.hyperboloid) will fail (yielding infinite values).'''
+    __slots__ = ('style',)
 
     def __init__(self,*args,**kwargs):
-        self.color = 'black'
-        self.layer = 'foreground'
+        self.style = styleid('black','foreground')
 
     @classmethod
     def fromdisk(cls,z):
@@ -355,30 +569,15 @@ class Point(complex):
         px,py,pt = p.hyperboloid
         qx,qy,qt = q.hyperboloid
         midx,midy,midt = (px+qx)/2,(py+qy)/2,(pt+qt)/2
-        midnorm = sqrt(midt**2 - midx**2 + midy**2)
+        midnorm = sqrt(midt**2 - midx**2 - midy**2)
         return Point.fromhyperboloid([midx/midnorm,midy/midnorm,midt/midnorm])
 
     @property
-    def tikzline(self):
+    def primitives(self):
         if (pointsize/2)*(1-abs(complex(self))**2) < smallestsize:
-            return ''
-        x = pgfdiskradius*complex(self)
-        size = pgfdiskradius*(pointsize/2)*(pgfdiskradius**2-abs(x)**2)/pgfdiskradius**2
-        sizestr = '{:.3f}'.format(size)  
-        if sizestr ==  '0.000':
-            return ''                       # We avoid outputting points of radius (0.000).
-        return '\\draw[fill='+self.color+','+self.color+'] '+'({:.3f},{:.3f})'.format(x.real,x.imag)+' circle '+'({:.3f})'.format(size)+';'
+            return []
+        return [('dot',complex(self),(pointsize/2)*(1-abs(complex(self))**2),self.color)]
 
-    @property
-    def svgline(self):
-        if (pointsize/2)*(1-abs(complex(self))**2) < smallestsize:
-            return ''
-        x = svgdiskradius*complex(self)
-        size = svgdiskradius*(pointsize/2)*(svgdiskradius**2-abs(x)**2)/svgdiskradius**2
-        sizestr = '{:.3f}'.format(size)
-        if sizestr ==  '0.000':
-            return ''                       # We avoid outputting points of radius (0.000).
-        return '<circle cx="{:.3f}" cy="{:.3f}" r="{:.3f}" fill="{}" stroke="{}"/>'.format(x.real,x.imag,size,self.color,self.color)
 
     def __rmul__(self,frame):
         '''Frames acting on points as isometries.'''
@@ -388,19 +587,19 @@ class Point(complex):
         else:
             z = complex(self)
         result = Point((a*z+b)/(c*z+d))
-        result.color = self.color
-        result.layer = self.layer
+        result.style = self.style
         return result
 
-class Boundarypoint():
+class Boundarypoint(Styled):
     '''Boundary points represent points on the boundary circle.
 
     They are constructed by giving an angle'''
+    __slots__ = ('angle','style')
+
     def __init__(self, angle):
         '''Construct the boundary point e^{i angle}.'''
         self.angle = angle
-        self.color = 'black'
-        self.layer = 'foreground'
+        self.style = styleid('black','foreground')
 
     def __repr__(self):
         return 'Boundarypoint(angle={:.3f})'.format(self.angle)
@@ -412,16 +611,9 @@ class Boundarypoint():
         return cos(self.angle) + sin(self.angle)*1j
 
     @property
-    def tikzline(self):
-        x = pgfdiskradius*complex(self)
-        size = pgfdiskradius*(pointsize/2)
-        return '\\draw[fill='+self.color+','+self.color+'] '+'({:.3f},{:.3f})'.format(x.real,x.imag)+' circle '+'({:.3f})'.format(size)+';'
+    def primitives(self):
+        return [('dot',complex(self),pointsize/2,self.color)]
 
-    @property
-    def svgline(self):
-        x = svgdiskradius*complex(self)
-        size = svgdiskradius*(pointsize/2)
-        return '<circle cx="{:.3f}" cy="{:.3f}" r="{:.3f}" fill="{}" stroke="{}"/>'.format(x.real,x.imag,size,self.color,self.color)
 
     def __rmul__(self,frame):
         '''Frames acting on points as isometries.'''
@@ -431,17 +623,17 @@ class Boundarypoint():
         else:
             z = complex(self)
         result = Boundarypoint(np.angle((a*z+b)/(c*z+d)))
-        result.color = self.color
-        result.layer = self.layer
+        result.style = self.style
         return result
 
-class Circle():
+class Circle(Styled):
     '''A circle with a given center and radius.'''
+    __slots__ = ('center','radius','style')
+
     def __init__(self,center,radius):
         self.center = center
         self.radius = radius
-        self.color = 'black'
-        self.layer = 'main'
+        self.style = styleid('black','main')
 
     def __str__(self):
         return 'Circle('+str((self.center,self.radius))+')'
@@ -450,50 +642,31 @@ class Circle():
         return 'Circle('+repr((self.center,self.radius))+')'
 
     @property
-    def tikzline(self):
+    def primitives(self):
         angle,distance = self.center.polar
         z = complex(Point.frompolar(angle,distance-self.radius))
         w = complex(Point.frompolar(angle,distance+self.radius))
         center = (z+w)/2
         radius = abs(z - center)
         if 2*radius < smallestsize:
-            return ''
-        radiusstr = '{:.3f}'.format(pgfdiskradius*radius)
-        if radiusstr == '0.000':
-            return ''               # Avoid outputting circles of radius 0 to the file.
-        return '\\draw['+self.color+'] '+'({:.3f},{:.3f})'.format(pgfdiskradius*center.real,pgfdiskradius*center.imag)+' circle '+'({:.3f})'.format(pgfdiskradius*radius)+';'
+            return []
+        return [('circle',center,radius,self.color)]
 
-    @property
-    def svgline(self):
-        angle,distance = self.center.polar
-        z = complex(Point.frompolar(angle,distance-self.radius))
-        w = complex(Point.frompolar(angle,distance+self.radius))
-        center = (z+w)/2
-        centerxstr = '{:.3f}'.format(svgdiskradius*center.real)
-        centerystr = '{:.3f}'.format(svgdiskradius*center.imag)
-        radius = abs(z - center)
-        if 2*radius < smallestsize:
-            return ''
-        radiusstr = '{:.3f}'.format(svgdiskradius*radius)
-        if radiusstr == '0.000':
-            return ''               # Avoid outputting circles of radius 0 to the file.
-        return '<circle cx="{}" cy="{}" r="{}" fill="none" stroke="{}"/>'.format(centerxstr,centerystr,radiusstr,self.color)
-        
 
     def __rmul__(self,frame):
         '''Frames acting on points as isometries.'''
         result = Circle(frame*self.center,self.radius)
-        result.color = self.color
-        result.layer = self.layer
+        result.style = self.style
         return result
 
 class Disk(Circle):
     '''A disk (or filled circle) with a given center and radius.'''
+    __slots__ = ()
+
     def __init__(self,center,radius):
         self.center = center
         self.radius = radius
-        self.color = 'black'
-        self.layer = 'background'
+        self.style = styleid('black','background')
 
     def __str__(self):
         return 'Disk('+str((self.center,self.radius))+')'
@@ -502,51 +675,32 @@ class Disk(Circle):
         return 'Disk('+repr((self.center,self.radius))+')'
 
     @property
-    def tikzline(self):
+    def primitives(self):
         angle,distance = self.center.polar
         z = complex(Point.frompolar(angle,distance-self.radius))
         w = complex(Point.frompolar(angle,distance+self.radius))
         center = (z+w)/2
         radius = abs(z - center)
         if 2*radius < smallestsize:
-            return ''
-        radiusstr = '{:.3f}'.format(pgfdiskradius*radius)
-        if radiusstr == '0.000':
-            return ''               # Avoid outputting circles of radius 0 to the file.
-        return '\\draw['+self.color+', fill='+self.color+'] '+'({:.3f},{:.3f})'.format(pgfdiskradius*center.real,pgfdiskradius*center.imag)+' circle '+'({:.3f})'.format(pgfdiskradius*radius)+';'
-
-    @property
-    def svgline(self):
-        angle,distance = self.center.polar
-        z = complex(Point.frompolar(angle,distance-self.radius))
-        w = complex(Point.frompolar(angle,distance+self.radius))
-        center = (z+w)/2
-        centerxstr = '{:.3f}'.format(svgdiskradius*center.real)
-        centerystr = '{:.3f}'.format(svgdiskradius*center.imag)
-        radius = abs(z - center)
-        if 2*radius < smallestsize:
-            return ''
-        radiusstr = '{:.3f}'.format(svgdiskradius*radius)
-        if radiusstr == '0.000':
-            return ''               # Avoid outputting circles of radius 0 to the file.
-        return '<circle cx="{}" cy="{}" r="{}" fill="{}" stroke="{}"/>'.format(centerxstr,centerystr,radiusstr,self.color,self.color)
+            return []
+        return [('disk',center,radius,self.color)]
 
 
     def __rmul__(self,frame):
         '''Frames acting on points as isometries.'''
         result = Disk(frame*self.center,self.radius)
-        result.color = self.color
-        result.layer = self.layer
+        result.style = self.style
         return result
 
 
-class Segment(object):
+class Segment(Styled):
     '''A segment between two points.'''
+    __slots__ = ('start','end','style')
+
     def __init__(self,start,end):
         self.start = start
         self.end = end
-        self.color = 'black'
-        self.layer = 'main'
+        self.style = styleid('black','main')
 
     def __str__(self):
         return str((self.start,self.end))
@@ -557,8 +711,7 @@ class Segment(object):
     def __rmul__(self,frame):
         '''Frames act on segments as isometries.'''
         result = Segment(frame*self.start,frame*self.end)
-        result.color = self.color
-        result.layer = self.layer
+        result.style = self.style
         return result
 
     @property
@@ -580,71 +733,28 @@ class Segment(object):
         return complex1 + tangent* (complex1*1j)
 
     @property
-    def tikzline(self):
+    def primitives(self):
         # check if the end points are too close to draw
         start, end = complex(self.start), complex(self.end)
         if abs(start-end) < smallestsize:
-            return ''
-        # If they are not get the string for each point.
-        pointstrings = ['({:.3f}, {:.3f})'.format(pgfdiskradius*p.real,pgfdiskradius*p.imag) for p in [start,end]]
-        
-        # check if the boundarypoints are almost opposite so we can draw a straight line
-        boundarypoints = self.boundarypoints
-        boundary1, boundary2 = complex(boundarypoints[0]), complex(boundarypoints[1])
-        if abs(np.angle(-boundary2/boundary1)) < smallestangle:
-            return '\\draw['+self.color+'] '+' -- '.join(pointstrings)+';'
+            return []
 
-        # If they are not we get the center of the Euclidean circle the geodesic is on.
-        center = self.center
-        radius = pgfdiskradius*abs(start-center)
-        startangle = 360*np.angle(start-center)/(2*pi)
-        # make sure the difference between startangle and endangle is less than 180
-        endangle = startangle + 360*np.angle((end-center)/(start-center))/(2*pi)
-
-        return '\\draw['+self.color+'] '+ pointstrings[0] +' arc ' + '({:.3f}:{:.3f}:{:.3f});'.format(startangle,endangle,radius)
-
-    @property
-    def svgline(self):
-        # check if the end points are too close to draw
-        start, end = complex(self.start), complex(self.end)
-        if abs(start-end) < smallestsize:
-            return ''
-        # If they are not get the string for each point.
-        pointstrings = ['{:.3f},{:.3f}'.format(svgdiskradius*p.real,svgdiskradius*p.imag) for p in [start,end]]
-        pointstrings[0] = 'M'+pointstrings[0]
-        pointstrings[1] = 'L'+pointstrings[1]
-        
         # check if the boundarypoints are almost opposite so we can draw a straight line
         boundarypoints = self.boundarypoints
         boundary1, boundary2 = complex(boundarypoints[0]), complex(boundarypoints[1])
         if abs(np.angle(-boundary2/boundary1)) < smallestangle:
-            return '<path d="{}" fill="none" stroke="{}"/>'.format(''.join(pointstrings),self.color)
+            return [('polyline',(start,end),self.color)]
 
-        # We're not going to line_to so we need to remove the leading L from the string for the second point
-        pointstrings[1] = pointstrings[1][1:]
+        # If they are not we need the center of the Euclidean circle the geodesic is on (computed as in .center).
+        center = boundary1 + tan(np.angle(boundary2/boundary1)/2)*(boundary1*1j)
+        return [('arc',start,end,center,self.color)]
 
-        # Get the center of the Euclidean circle the geodesic is on.
-        center = self.center
-        radius = svgdiskradius*abs(start-center)
-
-        angle = 360*np.angle((end-center)/(start-center))/(2*pi)
-
-        # Svg needs the start point, endpoint radius (actually x and y radius both equal in our case),
-        # rotation of x axis (0 in our case),
-        # a flag noting if the long arc is drawn or the short one (0 for short arc is always our case),
-        # and one flat determines which side the center is on (the one we will set now)
-        # If you do this wrong either Segment(p,q) or Segment(q,p) will bend in the wrong direction.
-        if angle <= 0:
-            sweepflag = '0'
-        else:
-            sweepflag = '1'
-        d = pointstrings[0]+ ' A{:3f},{:3f} 0 0 {} '.format(radius,radius, sweepflag)+pointstrings[1]
-
-        return '<path d="{}" fill="none" stroke="{}"/>'.format(d,self.color)
 
 
 class Halfline(Segment):
     '''An infinite halfline starting at a frame's basepoint and extending in the direction given by the first vector.'''
+    __slots__ = ()
+
     def __init__(self,frame):
         self.start = frame.basepoint
         start = self.start
@@ -658,8 +768,7 @@ class Halfline(Segment):
         t = (-b + sqrt(b**2 - 4*a*c))/(2*a)
         endklein = z + t*u
         self.end = Boundarypoint(np.angle(endklein))
-        self.color = 'black'
-        self.layer = 'main'
+        self.style = styleid('black','main')
 
     @classmethod
     def fromtwopoints(cls,start,end):
@@ -672,12 +781,13 @@ class Halfline(Segment):
     def __rmul__(self,frame):
         '''Frames act on Halflines by isometry.'''
         result = Halfline.fromtwopoints(frame*self.start,frame*self.end)
-        result.color = self.color
-        result.layer = self.layer
+        result.style = self.style
         return result
 
 class Line(Segment):
     '''An infinite line in direction of the first vector of a frame.'''
+    __slots__ = ()
+
     def __init__(self,frame):
         base = frame.basepoint
         forward = (frame * Frame.forward(1)).basepoint
@@ -693,8 +803,7 @@ class Line(Segment):
         t = (-b - sqrt(b**2 - 4*a*c))/(2*a)
         startklein = z+t*u
         self.start = Boundarypoint(np.angle(startklein))
-        self.color = 'black'
-        self.layer = 'main'
+        self.style = styleid('black','main')
 
     @classmethod
     def fromtwopoints(cls,start,end):
@@ -706,10 +815,93 @@ class Line(Segment):
 
     def __rmul__(self,frame):
         result = Line.fromtwopoints(frame*self.start,frame*self.end)
-        result.color = self.color
-        result.layer = self.layer
+        result.style = self.style
         return result
     
+class Polygon(Styled):
+    '''A (possibly filled) polygon with geodesic sides through a list of points (which can include Boundarypoints).
+
+    The vertices are kept in a numpy array so Frames move them all at once, and the polygon is drawn as a single closed path.
+    The .color attribute is used for the sides, and the interior is filled with the color in the .fill attribute unless it is None.'''
+    __slots__ = ('vertices','fill','style')
+
+    def __init__(self,points,fill=None):
+        self.vertices = np.asarray(points,dtype=complex)
+        self.fill = fill
+        self.style = styleid('black','main')
+
+    def __str__(self):
+        return 'Polygon('+str(list(self.vertices))+')'
+
+    def __repr__(self):
+        return 'Polygon('+repr(list(self.vertices))+')'
+
+    def __rmul__(self,frame):
+        '''Frames act on polygons as isometries.'''
+        a,b,c,d = frame[0,0],frame[0,1],frame[1,0],frame[1,1]
+        if frame.orientation == -1:
+            z = self.vertices.conjugate()
+        else:
+            z = self.vertices
+        result = Polygon((a*z+b)/(c*z+d),self.fill)
+        result.style = self.style
+        return result
+
+    @property
+    def centers(self):
+        '''The centers of the Euclidean circles containing each side (nan for sides drawn as Euclidean segments).
+
+        The side from z to w is on the circle orthogonal to the boundary through z and w, whose center c solves
+        the linear equations Re(conjugate(c)*z) = (1+|z|^2)/2 and Re(conjugate(c)*w) = (1+|w|^2)/2.'''
+        z = self.vertices
+        w = np.roll(z,-1)
+        pz, pw = (1+np.abs(z)**2)/2, (1+np.abs(w)**2)/2
+        determinant = (z.conjugate()*w).imag
+        with np.errstate(divide='ignore',invalid='ignore'):
+            centers = ((pz*w.imag - pw*z.imag) + (z.real*pw - w.real*pz)*1j)/determinant
+            radii = np.sqrt(np.abs(centers)**2 - 1)
+            # As for Segments, sides whose boundary points are almost opposite (the arc turns less than smallestangle) are drawn straight.
+            straight = ~np.isfinite(radii) | (2*np.arctan(1/radii) < smallestangle) | (np.abs(z-w) < smallestsize)
+        return np.where(straight,np.nan,centers)
+
+    @property
+    def primitives(self):
+        if len(self.vertices) < 2 or np.max(np.abs(self.vertices-self.vertices[0])) < smallestsize:
+            return []
+        centers = [None if np.isnan(c) else complex(c) for c in self.centers]
+        return [('polygon',[complex(z) for z in self.vertices],centers,self.fill,self.color)]
+
+class Curve(Styled):
+    '''A curve drawn as Euclidean segments joining a list of points (for example the trajectory of a flow, see flows.py).'''
+    __slots__ = ('points','style')
+
+    def __init__(self,points):
+        self.points = np.asarray(points,dtype=complex)
+        self.style = styleid('black','main')
+
+    def __str__(self):
+        return 'Curve('+str(list(self.points))+')'
+
+    def __repr__(self):
+        return 'Curve('+repr(list(self.points))+')'
+
+    def __rmul__(self,frame):
+        '''Frames act on curves by moving their points.'''
+        a,b,c,d = frame[0,0],frame[0,1],frame[1,0],frame[1,1]
+        if frame.orientation == -1:
+            z = self.points.conjugate()
+        else:
+            z = self.points
+        result = Curve((a*z+b)/(c*z+d))
+        result.style = self.style
+        return result
+
+    @property
+    def primitives(self):
+        if len(self.points) < 2:
+            return []
+        return [('polyline',[complex(z) for z in self.points],self.color)]
+
 def stickman(size=1):
     '''Returns a (rudimentary) stickman figure at the origin.'''
     head = Circle((Frame.rotate(pi/2)*Frame.forward(0.75*size)).basepoint,0.25*size)
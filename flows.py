@@ -0,0 +1,105 @@
+'''Geodesic and horocycle flows acting on many unit tangent vectors at once.
+
+A Flow holds N tangent vectors as a stacked array of Frame matrices.  Each step multiplies all of them on the right by the same
+closed form matrix (Frame.forward(t) for the geodesic flow, Frame.sideways(t) for the horocycle flow), and the trajectories are
+recorded as arrays: a geodesic flow trajectory is a Segment from where the vector started to where it ends, and horocycle flow
+trajectories are sampled into Curves, leaving out steps that move less than smallestsize.
+
+Example usage:
+
+        >>> from flows import *
+        >>> f = Flow([Tangent.rotate(2*pi*i/1000)*Tangent.forward(0.5) for i in range(1000)])
+        >>> f.sideways(2,steps=50)
+        >>> f.forward(1)
+        >>> g = f.figure()
+        >>> g.update(Red(t) for t in f.tangents)
+        >>> g.writesvg('flows.svg')
+'''
+
+from dibujos import *
+from orbitstore import stack, compose, frames
+
+class Flow(object):
+    '''A list of tangent vectors moved together by the geodesic and horocycle flows.'''
+    def __init__(self,tangents):
+        self.matrices,self.orientations = stack(tangents)
+        self.segments = []          # pairs of arrays (starts, ends) of geodesic trajectories
+        self.curves = []            # arrays of shape (samples, N) of horocycle trajectories (nan where a sample was left out)
+        self.geodesicstart = None   # basepoints where the current run of forward() calls started
+        self.geodesicsign = 0       # the sign of the distances in the current run of forward() calls
+        self.samples = None         # samples of the current run of sideways() calls
+        self.lastkept = None        # the last sample kept of each trajectory of the current run of sideways() calls
+
+    def __len__(self):
+        return len(self.matrices)
+
+    @property
+    def basepoints(self):
+        return self.matrices[:,0,1]/self.matrices[:,1,1]
+
+    @property
+    def tangents(self):
+        '''The current vectors as Tangent objects.'''
+        return frames(self.matrices,self.orientations,cls=Tangent)
+
+    def move(self,frame):
+        self.matrices,self.orientations = compose(self.matrices,self.orientations,frame)
+
+    def close(self):
+        '''Records the trajectories of the current run of forward() or sideways() calls.'''
+        if self.geodesicstart is not None:
+            self.segments.append((self.geodesicstart,self.basepoints))
+            self.geodesicstart = None
+        if self.samples is not None:
+            self.curves.append(np.array(self.samples))
+            self.samples = None
+            self.lastkept = None
+
+    def forward(self,distance):
+        '''Moves every vector distance along its geodesic.
+
+        Consecutive calls in the same direction are recorded as one Segment per vector, a change of direction starts a new one.'''
+        sign = np.sign(distance)
+        if self.samples is not None or (self.geodesicstart is not None and sign != self.geodesicsign):
+            self.close()
+        if self.geodesicstart is None:
+            self.geodesicstart = self.basepoints
+            self.geodesicsign = sign
+        self.move(Frame.forward(distance))
+
+    def sideways(self,distance,steps=32):
+        '''Moves every vector distance along its horocycle, sampling its trajectory in the given number of steps.'''
+        if self.geodesicstart is not None:
+            self.close()
+        if self.samples is None:
+            self.samples = [self.basepoints]
+            self.lastkept = self.basepoints
+        step = Frame.sideways(distance/steps)
+        for i in range(steps):
+            self.move(step)
+            z = self.basepoints
+            keep = np.abs(z-self.lastkept) >= smallestsize
+            if i == steps-1:
+                keep[:] = True      # The endpoints are always kept.
+            self.samples.append(np.where(keep,z,np.nan))
+            self.lastkept = np.where(keep,z,self.lastkept)
+
+    def rotate(self,angle):
+        '''Rotates every vector by angle in place.'''
+        self.close()
+        self.move(Frame.rotate(angle))
+
+    def figure(self):
+        '''A Figure with the recorded trajectories.'''
+        self.close()
+        result = Figure()
+        for starts,ends in self.segments:
+            for start,end in zip(starts,ends):
+                if abs(start-end) >= smallestsize:
+                    result.add(Segment(Point(start),Point(end)))
+        for samples in self.curves:
+            for trajectory in samples.T:
+                points = trajectory[~np.isnan(trajectory)]
+                if len(points) >= 2:
+                    result.add(Curve(points))
+        return result
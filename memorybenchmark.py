@@ -0,0 +1,25 @@
+'''Measures the memory used by drawables, in bytes per object.'''
+
+import tracemalloc
+from dibujos import *
+
+def bytesperobject(constructor,n=100000):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [constructor(i) for i in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after-before)/n
+
+constructors = {
+    'Point': lambda i: Red(Point(0.5/(i+1))),
+    'Boundarypoint': lambda i: Red(Boundarypoint(i)),
+    'Circle': lambda i: Red(Circle(Point(0.5/(i+1)),0.1)),
+    'Disk': lambda i: Red(Disk(Point(0.5/(i+1)),0.1)),
+    'Segment': lambda i: Red(Segment(Point(0.5/(i+1)),Point(-0.5))),
+    'Frame': lambda i: Red(Frame.rotate(i)),
+}
+
+if __name__ == '__main__':
+    for name in constructors:
+        print('{:15} {:8.1f} bytes per object'.format(name,bytesperobject(constructors[name])))
@@ -1,5 +1,99 @@
 from dibujos import *
-from itertools import product
+from itertools import product, count
+
+class Integermatrix(tuple):
+    '''An element of PSL(2,Z) stored exactly as a tuple (a,b,c,d) of Python integers.
+
+    The sign is normalized so that c > 0, or c == 0 and d > 0.  Hence two matrices representing the same
+    element of PSL(2,Z) are equal as tuples, and they can be hashed and deduplicated exactly.
+    Composition is integer arithmetic so deep orbits don't drift.  Use .frame (or toframes for many elements at once)
+    to get the corresponding Frame when the figure is rendered.
+    The tuple operations that don't make sense for matrices (+ and repetition by integers) raise TypeError.'''
+    def __new__(cls,a,b,c,d):
+        if a*d-b*c != 1:
+            raise ValueError('An element of PSL(2,Z) has determinant 1, not '+str(a*d-b*c))
+        if c < 0 or (c == 0 and d < 0):
+            a,b,c,d = -a,-b,-c,-d
+        return super().__new__(cls,(a,b,c,d))
+
+    def __repr__(self):
+        return 'Integermatrix'+super().__repr__()
+
+    def __mul__(self,other):
+        if not isinstance(other,Integermatrix):
+            return NotImplemented
+        a,b,c,d = self
+        e,f,g,h = other
+        return Integermatrix(a*e+b*g,a*f+b*h,c*e+d*g,c*f+d*h)
+
+    def __rmul__(self,other):
+        return NotImplemented
+
+    def __add__(self,other):
+        return NotImplemented
+
+    def __pow__(self,n):
+        if n < 0:
+            return self.inverse**(-n)
+        result = Integermatrix.identity()
+        for i in range(n):
+            result = result*self
+        return result
+
+    @classmethod
+    def identity(cls):
+        return cls(1,0,0,1)
+
+    @classmethod
+    def a(cls):
+        '''The generator z -> -1/z of the upper half plane, it corresponds to Tangent.rotate(pi).'''
+        return cls(0,-1,1,0)
+
+    @classmethod
+    def b(cls):
+        '''The generator z -> -1/(z+1), it corresponds to Tangent.rotate(pi)*Tangent.sideways(1).'''
+        return cls(0,-1,1,1)
+
+    @property
+    def inverse(self):
+        a,b,c,d = self
+        return Integermatrix(d,-b,-c,a)
+
+    @property
+    def frame(self):
+        '''The Frame acting on the disk as this matrix acts on the upper half plane.'''
+        return Frame.fromrealmatrix([[self[0],self[1]],[self[2],self[3]]])
+
+    def ingamma0(self,N):
+        '''True if the element belongs to the congruence subgroup Gamma_0(N) (c = 0 mod N).'''
+        return self[2] % N == 0
+
+    def ingamma1(self,N):
+        '''True if the element belongs to the image of Gamma_1(N) in PSL(2,Z) (c = 0 and a = d = 1 mod N up to sign).'''
+        a,b,c,d = self
+        return c % N == 0 and ((a-1) % N == 0 and (d-1) % N == 0 or (a+1) % N == 0 and (d+1) % N == 0)
+
+    def ingamma(self,N):
+        '''True if the element belongs to the image of the principal congruence subgroup Gamma(N) in PSL(2,Z).'''
+        return self[1] % N == 0 and self.ingamma1(N)
+
+def diskmatrices(elements):
+    '''The matrices (shape (k,2,2)) of the Frames corresponding to a list of Integermatrix, all computed at once.'''
+    matrices = np.array(list(elements),dtype=float).reshape(-1,2,2)
+    halfplanetodisk = np.array([[1., -1j], [1., 1j]])
+    disktohalfplane = np.linalg.inv(halfplanetodisk)
+    return halfplanetodisk @ matrices @ disktohalfplane
+
+def toframes(elements,cls=Frame):
+    '''Converts a list of Integermatrix to Frames (or Tangents if cls=Tangent).
+    
+    The change of coordinates from the upper half plane to the disk is done for all the elements at once.'''
+    frames = []
+    for m in diskmatrices(elements):
+        s = cls([[m[0,0],m[0,1]],[m[1,0],m[1,1]]])
+        s.orientation = +1
+        frames.append(s)
+    return frames
 
 def modulargroup(n):
     '''Generator for elements of length n or less in the modular group.
@@ -20,8 +114,38 @@ def modulargroup(n):
             	yield result
             	yield a*result*a
 
-def stickmaninmodulargroup(n=10,name='test8.pgf'):
-    '''An example test figure.  A stickman in the modular group.''' 
+def modulargrouplevels(n=None):
+    '''Generator of lists of Integermatrix, the elements of modulargroup(n) of each length (without repetitions), shortest first.
+    With n=None it goes on forever.'''
+    a = Integermatrix.a()
+    b = Integermatrix.b()
+    B = [b,b**2]
+    seen = set()
+    for length in (range(n) if n is not None else count()):
+        level = []
+        for bees in product(B,repeat=length//2):
+            result = Integermatrix.identity()
+            for x in bees:
+                result = result * x * a
+            if length%2 == 1:
+                candidates = [a*result, result*b, result*b**2]
+            else:
+                candidates = [result, a*result*a]
+            for x in candidates:
+                if x not in seen:
+                    seen.add(x)
+                    level.append(x)
+        yield level
+
+def exactmodulargroup(n):
+    '''Same elements as modulargroup(n) but as Integermatrix instances, each one yielded only once.'''
+    for level in modulargrouplevels(n):
+        yield from level
+
+def stickmaninmodulargroup(n=10,name='test8.pgf',progressive=False,snapshotinterval=None,timebudget=None):
+    '''An example test figure.  A stickman in the modular group.
+
+    With progressive=True the file is written one word length at a time (see progressive.py).''' 
     left = Point.fromhalfplane(-0.5*0.95+1.05*sin(acos(0.5))*1j)
     right = Point.fromhalfplane(0.5*0.95+1.05*sin(acos(0.5))*1j)
     stick = Tangent.forward(0.3)*stickman(0.3)
@@ -31,10 +155,14 @@ def stickmaninmodulargroup(n=10,name='test8.pgf'):
     righthalf.color = 'blue'
     lefthalf = Segment(left,Point(0.999))
     lefthalf.color = 'green'
-    f = Figure()
-    for t in modulargroup(n):
-        f.add(t*seg)
-        f.add(t*lefthalf)
-        f.add(t*righthalf)
-        f.update(t*stick)
-    f.writepgf(name)
\ No newline at end of file
+    base = Figure([seg,lefthalf,righthalf])
+    base.update(stick)
+    if progressive:
+        from progressive import Progressivewriter
+        with Progressivewriter(name,snapshotinterval=snapshotinterval,timebudget=timebudget) as writer:
+            for level in modulargrouplevels(n):
+                if not writer.add(Instancedfigure(base,toframes(level,cls=Tangent))):
+                    break
+    else:
+        f = Instancedfigure(base,toframes(exactmodulargroup(n),cls=Tangent))
+        f.writepgf(name)
\ No newline at end of file
@@ -0,0 +1,210 @@
+'''Out of core orbits of triangle groups, for tilings with more elements than fit in memory.
+
+Group elements are stored as stacked Frame matrices in numpy arrays, kept on disk as chunked .npy files (read back as memmaps).
+Each word length is computed from the previous one chunk by chunk, so memory use is bounded by memorybudget whatever the depth,
+and writers also read the finished elements one chunk at a time.
+
+Example usage:
+
+        >>> from orbitstore import *
+        >>> orbit = triangleorbit(8,8,4,depth=20,directory='orbit',single=True)
+        >>> writeorbit(orbit,triangletile(8,8,4),'tiling.svg')
+'''
+
+import os
+from dibujos import *
+from math import acosh
+from progressive import Progressivewriter
+
+memorybudget = 2**28    # in bytes
+
+class Chunkedarray(object):
+    '''A one dimensional structured array stored as a sequence of .npy files of at most chunkrows rows each.
+
+    Rows are appended with append (and kept in memory only until a chunk is full), and read back with chunks().'''
+    def __init__(self,directory,name,dtype,chunkrows):
+        os.makedirs(directory,exist_ok=True)
+        self.directory = directory
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.chunkrows = chunkrows
+        self.files = []
+        self.buffer = []
+        self.buffered = 0
+        self.rows = 0
+
+    def __len__(self):
+        return self.rows + self.buffered
+
+    def append(self,array):
+        self.buffer.append(np.asarray(array,dtype=self.dtype))
+        self.buffered += len(array)
+        if self.buffered >= self.chunkrows:
+            self.flush(full=True)
+
+    def flush(self,full=False):
+        '''Writes the buffered rows to chunk files (with full=True only complete chunks are written).'''
+        if self.buffered == 0:
+            return
+        data = np.concatenate(self.buffer)
+        while len(data) >= self.chunkrows or (not full and len(data) > 0):
+            rows = min(self.chunkrows,len(data))
+            filename = os.path.join(self.directory,'{}-{:06d}.npy'.format(self.name,len(self.files)))
+            chunk = np.lib.format.open_memmap(filename,mode='w+',dtype=self.dtype,shape=(rows,))
+            chunk[:] = data[:rows]
+            chunk.flush()
+            del chunk
+            self.files.append(filename)
+            self.rows += rows
+            data = data[rows:]
+        self.buffer = [data] if len(data) > 0 else []
+        self.buffered = len(data)
+
+    def chunks(self):
+        '''Yields the stored rows one chunk (a read only memmap) at a time.'''
+        self.flush()
+        for filename in self.files:
+            yield np.load(filename,mmap_mode='r')
+
+    def remove(self):
+        '''Deletes the chunk files.'''
+        for filename in self.files:
+            os.remove(filename)
+        self.files = []
+        self.rows = 0
+        self.buffer = []
+        self.buffered = 0
+
+def stack(frames):
+    '''Returns the matrices (shape (k,2,2)) and orientations (shape (k,)) of a list of Frames.'''
+    matrices = np.array([np.asarray(f) for f in frames],dtype=complex).reshape(-1,2,2)
+    orientations = np.array([f.orientation for f in frames],dtype=np.int8)
+    return matrices,orientations
+
+def compose(matrices,orientations,frame):
+    '''The stacked frames f*frame for each f given by matrices and orientations (as in Frame.__mul__).'''
+    g = np.asarray(frame)
+    result = np.where((orientations == -1)[:,None,None],matrices @ g.conjugate(),matrices @ g)
+    return result,orientations*np.int8(frame.orientation)
+
+def frames(matrices,orientations,cls=Frame):
+    '''Frame objects (or Tangents if cls=Tangent) from stacked matrices and orientations.'''
+    result = []
+    for m,o in zip(matrices,orientations):
+        s = cls([[complex(m[0,0]),complex(m[0,1])],[complex(m[1,0]),complex(m[1,1])]])
+        s.orientation = int(o)
+        result.append(s)
+    return result
+
+def side(alpha,beta,gamma):
+    '''side of hyperbolic triangle from angles'''
+    return acosh((cos(alpha) + cos(beta)*cos(gamma))/(sin(beta)*sin(gamma)))
+
+def trianglegenerators(l,m,n):
+    '''The reflections a, b, c in the sides of the triangle of triangles.py (with angles pi/n at the origin, pi/m, and pi/l).
+
+    Returns the list [a,b,c] and a 3x3 array with the order of the rotation x*y for each pair of generators.'''
+    alpha,beta,gamma = pi/l, pi/m, pi/n
+    A = side(alpha,beta,gamma)
+    a = Frame.flip()
+    b = Frame.rotate(gamma)*Frame.flip()*Frame.rotate(-gamma)
+    c = Frame.forward(A)*Frame.rotate(pi-beta)*Frame.flip()*Frame.rotate(beta-pi)*Frame.forward(-A)
+    orders = np.zeros((3,3),dtype=int)
+    orders[0,1] = orders[1,0] = n     # a and b meet at the origin
+    orders[1,2] = orders[2,1] = l
+    orders[2,0] = orders[0,2] = m
+    return [a,b,c],orders
+
+def triangletile(l,m,n):
+    '''The fundamental triangle of the (l,m,n) triangle group drawn as in triangles.py.'''
+    alpha,beta,gamma = pi/l, pi/m, pi/n
+    A,B = side(alpha,beta,gamma),side(beta,gamma,alpha)
+    p1 = Point.frompolar(radius=0,angle=0)
+    p2 = Point.frompolar(radius=A,angle = 0)
+    p3 = Point.frompolar(radius=B,angle = gamma)
+    return Figure([Gray(Segment(p1,p2)),Blue(Segment(p2,p3)),Gray(Segment(p3,p1))])
+
+# Words in the generators are extended one letter at a time, keeping as state the last letter, the letter before it,
+# and the length of the alternating run of these two letters at the end of the word.
+# A run longer than the order of the pair can be shortened, and a run as long as the order equals the run starting with the other letter,
+# so these are not extended.  The words left still reach every element (at least in shortlex normal form), with fewer repetitions.
+
+frontierdtype = np.dtype([('matrix',complex,(2,2)),('orientation',np.int8),('last',np.int8),('previous',np.int8),('run',np.int16)])
+
+def orbitdtype(single=False):
+    return np.dtype([('matrix',np.complex64 if single else complex,(2,2)),('orientation',np.int8)])
+
+def extend(chunk,generators,orders):
+    '''The frontier rows obtained by appending each allowed generator to the words in chunk.'''
+    last,previous,run = chunk['last'],chunk['previous'],chunk['run']
+    result = []
+    for x,g in enumerate(generators):
+        newrun = np.where(last < 0,1,np.where(previous == x,run+1,2))
+        order = orders[x,np.maximum(last,0)]
+        first = np.where(newrun % 2 == 1,x,last)       # the first letter of the run, the other one is:
+        other = np.where(first == x,last,x)
+        allowed = (last != x) & ((newrun == 1) | (newrun < order) | ((newrun == order) & (first < other)))
+        selected = chunk[allowed]
+        rows = np.empty(len(selected),dtype=frontierdtype)
+        rows['matrix'],rows['orientation'] = compose(selected['matrix'],selected['orientation'],g)
+        rows['last'] = x
+        rows['previous'] = selected['last']
+        rows['run'] = newrun[allowed]
+        result.append(rows)
+    return np.concatenate(result)
+
+def trianglelevels(l,m,n):
+    '''Generator of the elements of the (l,m,n) triangle group in memory, one word length at a time (forever).
+
+    Yields pairs (matrices, orientations) with the words of length 0, 1, 2, ... (see triangleorbit for large orbits).'''
+    generators,orders = trianglegenerators(l,m,n)
+    frontier = np.zeros(1,dtype=frontierdtype)
+    frontier['matrix'] = np.eye(2)
+    frontier['orientation'] = 1
+    frontier['last'] = frontier['previous'] = -1
+    while True:
+        yield frontier['matrix'].copy(),frontier['orientation'].copy()
+        frontier = extend(frontier,generators,orders)
+
+def triangleorbit(l,m,n,depth,directory,memorybudget=memorybudget,single=False):
+    '''Computes the elements of the (l,m,n) triangle group given by words of length at most depth, stored in directory.
+
+    Returns a Chunkedarray of the finished elements (fields 'matrix' and 'orientation').
+    With single=True the finished elements are stored in single precision (half the disk space), the frontier always uses double precision.'''
+    generators,orders = trianglegenerators(l,m,n)
+    # Processing a chunk holds it, its extensions, and the buffers of the next frontier and the orbit, about 8 chunks in all.
+    chunkrows = max(1,memorybudget//(8*frontierdtype.itemsize))
+    orbit = Chunkedarray(directory,'orbit',orbitdtype(single),chunkrows)
+    identity = np.zeros(1,dtype=frontierdtype)
+    identity['matrix'] = np.eye(2)
+    identity['orientation'] = 1
+    identity['last'] = identity['previous'] = -1
+    frontier = Chunkedarray(directory,'frontier0',frontierdtype,chunkrows)
+    frontier.append(identity)
+    for length in range(depth+1):
+        nextfrontier = Chunkedarray(directory,'frontier'+str(length+1),frontierdtype,chunkrows)
+        for chunk in frontier.chunks():
+            finished = np.empty(len(chunk),dtype=orbit.dtype)
+            finished['matrix'] = chunk['matrix']
+            finished['orientation'] = chunk['orientation']
+            orbit.append(finished)
+            if length < depth:
+                nextfrontier.append(extend(chunk,generators,orders))
+        frontier.remove()
+        frontier = nextfrontier
+    frontier.remove()
+    orbit.flush()
+    return orbit
+
+def writeorbit(orbit,base,filename,**options):
+    '''Writes the figure base moved by each element of orbit (a Chunkedarray) to filename, one chunk at a time.
+
+    The options are passed to Progressivewriter (e.g. snapshotinterval or timebudget).  Chunks are small parts of the figure,
+    so unless another snapshotinterval is given the file is rewritten every 10 seconds rather than after each one.'''
+    options.setdefault('snapshotinterval',10)
+    with Progressivewriter(filename,**options) as writer:
+        for chunk in orbit.chunks():
+            for i in range(0,len(chunk),Instancedfigure.chunksize):
+                part = chunk[i:i+Instancedfigure.chunksize]
+                if not writer.add(Instancedfigure(base,frames(part['matrix'],part['orientation']))):
+                    return
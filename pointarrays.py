@@ -0,0 +1,139 @@
+'''Vectorized versions of the Point model conversions, distances, and midpoints.
+
+Points are represented by numpy arrays of complex numbers (their coordinates in the Poincaré disk),
+so a cloud of 10^5 points is one array instead of 10^5 Point objects.
+
+Example usage:
+
+        >>> from pointarrays import *
+        >>> z = points([Point.frompolar(radius=1,angle=a) for a in np.linspace(0,2*pi,1000)])
+        >>> d = distancematrix(z)
+        >>> index = Pointindex(z)
+        >>> distances, nearest = index.nearest(z[:10]+0.01)
+'''
+
+from dibujos import *
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+def points(iterable):
+    '''A complex array with the disk coordinates of the given points.'''
+    return np.array([complex(p) for p in iterable],dtype=complex)
+
+def fromklein(z):
+    z = np.asarray(z,dtype=complex)
+    return z/(1+np.sqrt(1-np.minimum(1,np.abs(z)**2)))
+
+def fromhalfplane(z):
+    z = np.asarray(z,dtype=complex)
+    return (z-1j)/(z+1j)
+
+def fromhyperboloid(vectors):
+    '''Takes an array whose last axis has length 3 (x,y,t).'''
+    vectors = np.asarray(vectors,dtype=float)
+    x,y,t = vectors[...,0],vectors[...,1],vectors[...,2]
+    return x/(1+t) + y*1j/(1+t)
+
+def klein(z):
+    z = np.asarray(z,dtype=complex)
+    return 2*z/(1+np.abs(z)**2)
+
+def halfplane(z):
+    z = np.asarray(z,dtype=complex)
+    return (z*1j + 1j)/(-z + 1)
+
+def hyperboloid(z):
+    '''Returns an array whose last axis has length 3 (x,y,t).'''
+    z = np.asarray(z,dtype=complex)
+    p = 1+np.abs(z)**2
+    m = 1-np.abs(z)**2
+    return np.stack([2*z.real/m, 2*z.imag/m, p/m],axis=-1)
+
+def distance(p,q):
+    '''The distances between p and q (broadcasting as numpy does).'''
+    p = np.asarray(p,dtype=complex)
+    q = np.asarray(q,dtype=complex)
+    deltapq = 2*np.abs(p-q)**2/((1-np.abs(p)**2)*(1-np.abs(q)**2))
+    return np.arccosh(1+deltapq)
+
+def midpoint(p,q):
+    '''The midpoints of p and q (broadcasting as numpy does).'''
+    mid = (hyperboloid(p)+hyperboloid(q))/2
+    midnorm = np.sqrt(mid[...,2]**2 - mid[...,0]**2 - mid[...,1]**2)
+    return fromhyperboloid(mid/midnorm[...,None])
+
+def distancematrix(p,q=None):
+    '''The matrix of distances between each point in p and each point in q (q defaults to p).
+
+    It uses len(p)*len(q) floats of memory, see Pointindex for nearest neighbors among many points.'''
+    p = np.asarray(p,dtype=complex)
+    q = p if q is None else np.asarray(q,dtype=complex)
+    return distance(p[:,None],q[None,:])
+
+def euclideancircle(center,radius):
+    '''The Euclidean centers and radii of the hyperbolic circles with the given centers (complex arrays) and radii.'''
+    z = np.asarray(center,dtype=complex)
+    s2 = np.tanh(np.asarray(radius,dtype=float)/2)**2
+    denominator = 1-s2*np.abs(z)**2
+    return z*(1-s2)/denominator, np.sqrt(s2)*(1-np.abs(z)**2)/denominator
+
+class Pointindex(object):
+    '''An index of a complex array of points for hyperbolic nearest neighbor queries.
+
+    Hyperbolic balls are Euclidean disks in the Poincaré disk model, so the points are indexed by their Euclidean coordinates
+    (with scipy's cKDTree if scipy is installed, otherwise by sorting them by their real part).
+    A query first finds a candidate among the Euclidean neighbors and then searches the Euclidean disk of the hyperbolic ball
+    reaching the candidate, which must contain the nearest point.'''
+    window = 8      # Neighbors in the sorted order tried as candidates when scipy isn't available.
+
+    def __init__(self,points):
+        self.points = np.asarray(points,dtype=complex)
+        if cKDTree is not None:
+            self.tree = cKDTree(np.stack([self.points.real,self.points.imag],axis=-1))
+        else:
+            self.tree = None
+            self.order = np.argsort(self.points.real)
+            self.sortedreal = self.points.real[self.order]
+
+    def candidates(self,queries):
+        '''An index of some point for each query, to bound the distance to the nearest one.'''
+        if self.tree is not None:
+            return self.tree.query(np.stack([queries.real,queries.imag],axis=-1))[1]
+        positions = np.searchsorted(self.sortedreal,queries.real)
+        window = np.clip(positions[:,None]+np.arange(-self.window,self.window+1),0,len(self.points)-1)
+        indices = self.order[window]
+        best = np.argmin(distance(queries[:,None],self.points[indices]),axis=1)
+        return indices[np.arange(len(queries)),best]
+
+    def inside(self,centers,radii):
+        '''For each center and radius, the array of indices of the points in that Euclidean disk.'''
+        if self.tree is not None:
+            lists = self.tree.query_ball_point(np.stack([centers.real,centers.imag],axis=-1),radii)
+            return [np.asarray(l,dtype=int) for l in lists]
+        result = []
+        for center,radius in zip(centers,radii):
+            start = np.searchsorted(self.sortedreal,center.real-radius,side='left')
+            end = np.searchsorted(self.sortedreal,center.real+radius,side='right')
+            indices = self.order[start:end]
+            result.append(indices[np.abs(self.points[indices]-center) <= radius])
+        return result
+
+    def nearest(self,queries):
+        '''Returns two arrays: the hyperbolic distance from each query to the nearest point, and the index of that point.'''
+        queries = np.atleast_1d(np.asarray(queries,dtype=complex))
+        indices = self.candidates(queries)
+        bound = distance(queries,self.points[indices])
+        centers,radii = euclideancircle(queries,bound)
+        radii = radii*(1+1e-9) + 1e-15      # So that rounding doesn't leave out the candidate itself.
+        inside = self.inside(centers,radii)
+        # All (query, point) pairs are compared at once, then the closest pair of each query is kept.
+        owners = np.repeat(np.arange(len(queries)),[len(x) for x in inside])
+        others = np.concatenate(inside+[indices])
+        owners = np.concatenate([owners,np.arange(len(queries))])
+        d = distance(queries[owners],self.points[others])
+        order = np.lexsort((d,owners))
+        first = order[np.r_[True,owners[order][1:] != owners[order][:-1]]]
+        return d[first],others[first]
@@ -0,0 +1,144 @@
+'''Progressive output for figures computed level by level (for example orbits of a group, one word length at a time).
+
+A Progressivewriter appends each level to its output as soon as it is computed, instead of waiting for the whole figure.
+The output file is rewritten as a complete (valid) pgf or svg file after each level (or, if snapshotinterval is given, at most
+every snapshotinterval seconds) and when the writer is closed, so the coarse picture can be looked at while the deeper levels are still being computed.
+If a time or element budget is given the writer stops accepting drawables when it's used up and the file it leaves is still valid.
+
+Example usage:
+
+        >>> from progressive import *
+        >>> from modulargroup import modulargrouplevels, toframes
+        >>> with Progressivewriter('modular.svg',snapshotinterval=5,timebudget=60) as w:
+                w.serve(8000)       # Optional, shows the latest snapshot at http://localhost:8000
+                for level in modulargrouplevels(20):
+                    if not w.add(Instancedfigure(stickman(0.3),toframes(level))):
+                        break
+'''
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from dibujos import *
+
+class Progressivewriter(object):
+    '''Writes a pgf or svg file (depending on the extension of filename) incrementally.
+
+    Each call to add(figure) serializes the drawables of figure into one temporary file per layer.
+    snapshot() assembles these into filename, which happens after each add() (every snapshotinterval seconds if given) and on close().
+    Each snapshot copies everything added so far, so for many small additions a snapshotinterval is cheaper.'''
+    def __init__(self,filename,drawboundary=True,snapshotinterval=None,timebudget=None,elementbudget=None):
+        extension = os.path.splitext(filename)[1]
+        if extension not in ['.pgf','.svg']:
+            raise ValueError('Progressivewriter writes .pgf or .svg files, not '+repr(filename))
+        self.format = extension[1:]
+        self.filename = filename
+        self.drawboundary = drawboundary
+        self.snapshotinterval = snapshotinterval
+        self.timebudget = timebudget
+        self.elementbudget = elementbudget
+        self.layers = dict((layer,tempfile.TemporaryFile('w+')) for layer in ['background','main','foreground'])
+        self.elements = 0
+        self.start = self.lastsnapshot = time.time()
+        self.stopped = False
+        self.lock = threading.Lock()
+        self.server = None
+
+    def exhausted(self):
+        '''True if the time or element budget is used up.'''
+        if self.elementbudget is not None and self.elements >= self.elementbudget:
+            return True
+        return self.timebudget is not None and time.time() - self.start >= self.timebudget
+
+    def add(self,figure):
+        '''Appends the drawables of figure (a Figure or Instancedfigure).
+
+        Returns False if the budget ran out, in which case the rest of figure and anything added later is left out.'''
+        if self.stopped:
+            return False
+        serialize = tikzprimitive if self.format == 'pgf' else svgprimitive
+        with self.lock:
+            for layer in ['background','main','foreground']:
+                for primitive in figure.lowered(layer):
+                    line = serialize(primitive)
+                    if line != '':      # Avoid writting empty lines
+                        self.layers[layer].write(line+'\n')
+                        self.elements += 1
+                        if self.exhausted():
+                            self.stopped = True
+                            break
+                if self.stopped:
+                    break
+        if self.snapshotinterval is None or time.time() - self.lastsnapshot >= self.snapshotinterval:
+            self.snapshot()
+        return not self.stopped
+
+    def snapshot(self,filename=None):
+        '''Writes everything added so far as a complete file (by default to self.filename).'''
+        filename = filename or self.filename
+        temporary = filename+'.part'
+        with self.lock, open(temporary,'w') as f:
+            if self.format == 'pgf':
+                f.write(pgfheader(self.drawboundary))
+            else:
+                f.write(svgheader(self.drawboundary))
+            for layer in ['background','main','foreground']:
+                spool = self.layers[layer]
+                spool.flush()
+                spool.seek(0)
+                if self.format == 'pgf':
+                    f.write(pgflayerstart[layer])
+                shutil.copyfileobj(spool,f)
+                if self.format == 'pgf':
+                    f.write(pgflayerend[layer])
+                spool.seek(0,os.SEEK_END)
+            f.write(pgffooter() if self.format == 'pgf' else svgfooter())
+        os.replace(temporary,filename)    # So that the file is never seen half written.
+        self.lastsnapshot = time.time()
+
+    def close(self):
+        self.snapshot()
+        for spool in self.layers.values():
+            spool.close()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def serve(self,port=8000):
+        '''Serves a page showing the latest snapshot (reloading every few seconds) at http://localhost:port until the writer is closed.'''
+        writer = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/':
+                    if writer.format == 'svg':
+                        body = '<html><head><meta http-equiv="refresh" content="2"></head><body><img src="/figure.svg"></body></html>'
+                    else:
+                        body = '<html><head><meta http-equiv="refresh" content="2"></head><body><a href="/figure.pgf">figure.pgf</a></body></html>'
+                    self.reply(body.encode(),'text/html')
+                elif self.path == '/figure.'+writer.format and os.path.exists(writer.filename):
+                    with open(writer.filename,'rb') as f:
+                        self.reply(f.read(),'image/svg+xml' if writer.format == 'svg' else 'text/plain')
+                else:
+                    self.send_error(404)
+
+            def reply(self,body,contenttype):
+                self.send_response(200)
+                self.send_header('Content-Type',contenttype)
+                self.send_header('Content-Length',str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self,*args):
+                pass
+        self.server = ThreadingHTTPServer(('localhost',port),Handler)
+        threading.Thread(target=self.server.serve_forever,daemon=True).start()
+        return self.server
@@ -0,0 +1,130 @@
+'''A cache of rendered pgf and svg files, so that unchanged figures are not written again.
+
+The key of a figure is a hash of its contents together with the output parameters of dibujos
+(pgfdiskradius, svgdiskradius, pointsize, tangentsize, smallestsize, smallestangle).
+Rendered files are kept in a local directory whose total size is bounded, the least recently used files are removed first.
+
+Example usage:
+
+        >>> from rendercache import cachedwrite
+        >>> cachedwrite(stickman(0.5),'test4.pgf','pgf')
+
+Running scripts through the cache (every writepgf and writesvg call they make goes through cachedwrite):
+
+        python rendercache.py test1.py test4.py test5.py
+
+Files written with a Progressivewriter (as triangles.py does) are written while the figure is computed and aren't cached.
+'''
+
+import os
+import sys
+import shutil
+import tempfile
+import hashlib
+import runpy
+import dibujos
+from dibujos import *
+
+cachedirectory = '.dibujoscache'
+maxcachesize = 500*2**20    # in bytes
+
+# The writers that actually render figures, cachedwrite falls back on these.
+writers = {'pgf':Figure.writepgf, 'svg':Figure.writesvg}
+
+def canonical(x):
+    '''A string describing a drawable or figure exactly.  Figures are unordered so their drawables are sorted.'''
+    name = type(x).__name__
+    if isinstance(x,Instancedfigure):
+        return name+'('+canonical(x.base)+';'+','.join(canonical(g) for g in x.isometries)+')'
+    if isinstance(x,Figure):
+        return name+'('+','.join(sorted(canonical(y) for y in x))+')'
+    if isinstance(x,Frame):
+        return name+'('+repr(np.asarray(x).tolist())+','+str(x.orientation)+','+x.color+','+x.layer+')'
+    if isinstance(x,Point):
+        return name+'('+repr(complex(x))+','+x.color+','+x.layer+')'
+    if isinstance(x,Styled):
+        state = x.__getstate__()
+        return name+'('+','.join(key+'='+canonical(state[key]) for key in sorted(state))+')'
+    if isinstance(x,np.ndarray):
+        # repr rounds and abbreviates arrays, so the exact bytes are hashed instead.
+        data = np.ascontiguousarray(x)
+        return name+'('+str(data.dtype)+','+str(data.shape)+','+hashlib.sha256(data.tobytes()).hexdigest()+')'
+    return repr(x)
+
+def figurehash(figure,format,drawboundary=True):
+    '''The cache key of figure written in the given format ('pgf' or 'svg').'''
+    parameters = [format,drawboundary] + [getattr(dibujos,name) for name in ['pgfdiskradius','svgdiskradius','pointsize','tangentsize','smallestsize','smallestangle']]
+    h = hashlib.sha256(repr(parameters).encode())
+    h.update(canonical(figure).encode())
+    return h.hexdigest()
+
+def evict(directory=None,maxsize=None):
+    '''Removes the least recently used files from the cache until its total size is at most maxsize.'''
+    directory = directory or cachedirectory
+    maxsize = maxcachesize if maxsize is None else maxsize
+    entries = []
+    for name in os.listdir(directory):
+        if os.path.splitext(name)[1] not in ['.pgf','.svg']:
+            continue        # Files still being written by cachedwrite.
+        path = os.path.join(directory,name)
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:
+            continue        # Removed by another writer meanwhile.
+        entries.append((info.st_mtime,info.st_size,path))
+    entries.sort()
+    total = sum(size for mtime,size,path in entries)
+    for mtime,size,path in entries:
+        if total <= maxsize:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def cachedwrite(figure,filename,format,drawboundary=True,directory=None,maxsize=None,lowered=None):
+    '''Writes figure to filename in the given format ('pgf' or 'svg'), copying a cached file if there is one.
+
+    Returns True if the cached file was used.  If lowered (see Figure.write) is given the cache is not used, since the file
+    is written from lowered and not from figure, whose hash wouldn't describe it.'''
+    if lowered is not None:
+        writers[format](figure,filename,drawboundary,lowered)
+        return False
+    directory = directory or cachedirectory
+    os.makedirs(directory,exist_ok=True)
+    cached = os.path.join(directory,figurehash(figure,format,drawboundary)+'.'+format)
+    try:
+        shutil.copyfile(cached,filename)
+        os.utime(cached)        # Marks it as recently used.
+        return True
+    except FileNotFoundError:
+        pass                    # Not cached, or evicted by another writer.
+    writers[format](figure,filename,drawboundary,lowered)
+    # Each writer (process or thread) copies to its own temporary file, which evict leaves alone.
+    handle,temporary = tempfile.mkstemp(suffix='.part',dir=directory)
+    os.close(handle)
+    shutil.copyfile(filename,temporary)
+    os.replace(temporary,cached)
+    evict(directory,maxsize)
+    return False
+
+def cachedwritepgf(self,filename,drawboundary=True,lowered=None):
+    cachedwrite(self,filename,'pgf',drawboundary,lowered=lowered)
+
+def cachedwritesvg(self,filename,drawboundary=True,lowered=None):
+    cachedwrite(self,filename,'svg',drawboundary,lowered=lowered)
+
+def runscripts(scripts):
+    '''Runs the given python scripts with every writepgf and writesvg going through the cache.'''
+    for cls in [Figure,Instancedfigure]:
+        cls.writepgf, cls.writesvg = cachedwritepgf, cachedwritesvg
+    try:
+        for script in scripts:
+            runpy.run_path(script,run_name='__main__')
+    finally:
+        for cls in [Figure,Instancedfigure]:
+            cls.writepgf, cls.writesvg = writers['pgf'], writers['svg']
+
+if __name__ == '__main__':
+    runscripts(sys.argv[1:])
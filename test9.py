@@ -0,0 +1,34 @@
+from voronoi import *
+from pointarrays import distance
+import time
+
+def kleinof(p):
+    return np.exp(1j*p.angle) if isinstance(p,Boundarypoint) else p.klein
+
+def check(points,name,samples=None):
+    '''Checks that points of the Voronoi edges are equidistant to their two sites and not closer to any other site.'''
+    z = np.array([complex(p) for p in points])
+    start = time.time()
+    found = list(edges(points))
+    seconds = time.time()-start
+    checked = found if samples is None else [found[k] for k in np.random.default_rng(0).choice(len(found),samples,replace=False)]
+    for i,j,piece in checked:
+        a,b = kleinof(piece.start),kleinof(piece.end)
+        for s in np.linspace(0.02,0.98,5):
+            d = distance(complex(Point.fromklein(a+s*(b-a))),z)
+            assert abs(d[i]-d[j]) < 1e-6 and d.min() > d[i]-1e-6, (name,i,j)
+    print('{:20} {:6} points {:6} edges {:.2f}s'.format(name,len(z),len(found),seconds))
+
+t = Tangent.rotate(0.7)*Tangent.forward(0.4)
+check([Point(x) for x in (-0.5,-0.2,0.1,0.4)],'geodesic')
+check([Point.frompolar(angle=2*pi*i/7,radius=1) for i in range(7)],'circle')
+check([t*Tangent.forward(0.5*k)*Tangent.rotate(pi/2)*Tangent.forward(0.3)*Point(0) for k in range(-3,4)],'hypercycle')
+check([Tangent.sideways(0.6*k)*Tangent.rotate(pi/2)*Tangent.forward(0.5)*Point(0) for k in range(-3,4)],'horocycle')
+rng = np.random.default_rng(1)
+cloud = 0.99*np.sqrt(rng.uniform(size=20000))*np.exp(2j*pi*rng.uniform(size=20000))
+check([Point(z) for z in cloud],'random cloud',samples=200)
+
+z = [Point.frompolar(angle=2*pi*i/7,radius=1+(i%3)) for i in range(40)]
+f = voronoi(z)
+f.update(Red(x) for x in delaunay(z))
+f.writesvg('test9.svg')
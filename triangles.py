@@ -1,4 +1,5 @@
 from dibujos import *
+from progressive import Progressivewriter
 from math import acosh,sin,cos,pi
 
 def side(alpha,beta,gamma):
@@ -46,11 +47,6 @@ def extend(word):
 
 T = {'a':a,'b':b,'c':c}
 
-g = Figure()
-g.update(triangle)
-for w in T:
-    g.update(T[w]*triangle)
-
 def newtransforms(S):
     words = []
     for w in S:
@@ -58,14 +54,10 @@ def newtransforms(S):
            words.append(wp)
     return dict([(w,S[w[:-1]]*T[w[-1]]) for w in words])
 
-S = T
-for i in range(12):
-    for w in S:
-        g.update(S[w]*triangle)
-    S = newtransforms(S)
-
-f = Figure()
-f.update(g)
-
-f.writesvg('triangles.svg')
- 
+# The tiles are written one word length at a time, triangles.svg is rewritten every 10 seconds with what has been computed so far.
+with Progressivewriter('triangles.svg',snapshotinterval=10) as writer:
+    writer.add(Instancedfigure(triangle,[Frame.origin()]+list(T.values())))
+    S = T
+    for i in range(12):
+        writer.add(Instancedfigure(triangle,S.values()))
+        S = newtransforms(S)
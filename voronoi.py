@@ -0,0 +1,148 @@
+'''Hyperbolic Voronoi diagrams and Delaunay triangulations.
+
+In the Klein model bisectors are straight lines and the Voronoi diagram of a set of points is the power diagram of
+some Euclidean circles.  We compute it as the lower convex hull of the points on the hyperboloid (this is the usual lifting
+of a power diagram): each lower face of the hull corresponds to a point equidistant from its three vertices, whose Klein
+coordinates are read from the normal of the face, and the Voronoi edges are the straight segments joining the points of
+adjacent faces, clipped to the disk.  The convex hull is computed by scipy (qhull) in O(n log n) time.
+Points on one circle, horocycle, hypercycle or geodesic lift to a single plane, which qhull can't handle, so their
+diagram is drawn directly from the bisectors of consecutive points (see planaredges).
+
+Example usage:
+
+        >>> from voronoi import *
+        >>> z = [Point.frompolar(angle=2*pi*i/7,radius=1+(i%3)) for i in range(40)]
+        >>> f = voronoi(z)
+        >>> f.update(Red(x) for x in delaunay(z))
+        >>> f.writesvg('voronoi.svg')
+'''
+
+from dibujos import *
+from pointarrays import points as pointarray, hyperboloid
+
+def clip(start,direction,smin,smax):
+    '''The drawable for the part of the Klein line start + s*direction, smin <= s <= smax, inside the disk (None if empty).'''
+    a = abs(direction)**2
+    b = 2*(start*direction.conjugate()).real
+    c = abs(start)**2 - 1
+    discriminant = b**2 - 4*a*c
+    if a == 0 or discriminant <= 0:
+        return None
+    s1,s2 = (-b - sqrt(discriminant))/(2*a), (-b + sqrt(discriminant))/(2*a)
+    lo,hi = max(smin,s1), min(smax,s2)
+    if lo >= hi:
+        return None
+    ends = []
+    for s,boundary in [(lo,lo == s1),(hi,hi == s2)]:
+        z = start + s*direction
+        ends.append(Boundarypoint(np.angle(z)) if boundary else Point.fromklein(z))
+    if isinstance(ends[0],Boundarypoint) and isinstance(ends[1],Boundarypoint):
+        return Line.fromtwopoints(ends[0],ends[1])
+    if isinstance(ends[0],Boundarypoint):
+        return Halfline.fromtwopoints(ends[1],ends[0])
+    if isinstance(ends[1],Boundarypoint):
+        return Halfline.fromtwopoints(ends[0],ends[1])
+    return Segment(ends[0],ends[1])
+
+def lowerfaces(vectors):
+    '''Returns (simplices, poles, neighbors) for the faces of the convex hull of the given hyperboloid vectors facing the origin.
+
+    poles are the Klein coordinates of the points equidistant to the vertices of each face and neighbors[f][k] is the face
+    across the edge opposite to vertex k, or -1 if that face doesn't face the origin.'''
+    from scipy.spatial import ConvexHull
+    hull = ConvexHull(vectors)
+    normals = hull.equations[:,:3]
+    lower = normals[:,2] < 0
+    renumber = -np.ones(len(normals),dtype=int)
+    renumber[lower] = np.arange(lower.sum())
+    normals = normals[lower]
+    poles = -(normals[:,0] + normals[:,1]*1j)/normals[:,2]
+    return hull.simplices[lower],poles,renumber[hull.neighbors[lower]]
+
+def planenormal(vectors):
+    '''The unit normal of the plane containing the given hyperboloid vectors, or None if they don't lie on one plane.'''
+    centered = vectors - vectors.mean(axis=0)
+    u,s,vt = np.linalg.svd(centered,full_matrices=False)
+    if len(vectors) > 3 and s[2] > 1e-9*s[0]:
+        return None
+    return vt[2]
+
+def bisector(xy,t,i,j,smin=-inf,smax=inf):
+    '''The drawable for the part of the bisector of points i and j with parameter between smin and smax (see clip).'''
+    w = xy[i]-xy[j]
+    return clip(w*(t[i]-t[j])/abs(w)**2,1j*w,smin,smax)
+
+def planaredges(xy,t,normal):
+    '''Yields the edges (as edges does) when the lifted points lie on one plane, where qhull can't be used.
+
+    This happens when the points are on a circle, a horocycle, a hypercycle or a geodesic (for example the orbit of a point
+    under a rotation or a translation).  All the bisectors go through the pole of the plane: for a circle it is the center,
+    and the Voronoi edges are rays from it between consecutive points.  Otherwise it is outside the disk (or at infinity),
+    the points are in order along the curve, and the bisectors of consecutive points are whole Voronoi edges.'''
+    n = normal[0] + normal[1]*1j
+    klein = xy/t
+    if abs(normal[2]) > abs(n):
+        pole = -n/normal[2]
+        angles = np.angle(klein - pole)
+        order = np.argsort(angles)
+        for i,j in zip(order,np.roll(order,-1)):
+            # The edge of i and j is the half of their bisector in the empty sector from i to j.
+            direction = 1j*(xy[i]-xy[j])
+            sector = (angles[j]-angles[i]) % (2*pi)
+            if (np.angle(direction)-angles[i]) % (2*pi) > sector:
+                direction = -direction
+            piece = clip(pole,direction,0,inf)
+            if piece is not None:
+                yield i,j,piece
+    else:
+        # Orders the points by the angle seen from the pole (this works with the pole at infinity too).
+        ratio = klein/n
+        order = np.argsort(ratio.imag/(1 + normal[2]*ratio.real))
+        for i,j in zip(order[:-1],order[1:]):
+            piece = bisector(xy,t,i,j)
+            if piece is not None:
+                yield i,j,piece
+
+def edges(points):
+    '''Yields (i, j, piece) for each pair of points whose Voronoi cells share an edge, where piece is a Segment, Halfline or Line.'''
+    z = pointarray(points)
+    vectors = hyperboloid(z)
+    xy = vectors[:,0] + vectors[:,1]*1j
+    if len(z) == 2:
+        piece = bisector(xy,vectors[:,2],0,1)
+        if piece is not None:
+            yield 0,1,piece
+        return
+    if len(z) < 2:
+        return
+    normal = planenormal(vectors)
+    if normal is not None:
+        yield from planaredges(xy,vectors[:,2],normal)
+        return
+    simplices,poles,neighbors = lowerfaces(vectors)
+    for f in range(len(simplices)):
+        for k in range(3):
+            g = neighbors[f][k]
+            r = simplices[f][k]
+            i,j = [v for v in simplices[f] if v != r]
+            if g >= 0:
+                if g < f:
+                    continue    # This edge was done from the other face.
+                piece = clip(poles[f],poles[g]-poles[f],0,1)
+            else:
+                # The edge is on the silhouette of the hull, its Voronoi edge is a ray moving away from r.
+                direction = 1j*(xy[i]-xy[j])
+                if (direction*(xy[r]-xy[i]).conjugate()).real > 0:
+                    direction = -direction
+                piece = clip(poles[f],direction,0,inf)
+            if piece is not None:
+                yield i,j,piece
+
+def voronoi(points):
+    '''A Figure with the edges of the Voronoi diagram of the given points.'''
+    return Figure(piece for i,j,piece in edges(points))
+
+def delaunay(points):
+    '''A Figure with the Segments of the Delaunay triangulation of the given points (those joining points with adjacent Voronoi cells).'''
+    points = [p if isinstance(p,Point) else Point(p) for p in points]
+    return Figure(Segment(points[i],points[j]) for i,j,piece in edges(points))